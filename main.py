@@ -1,6 +1,12 @@
+import hashlib
+import mimetypes
 import os
+import re
 import zipfile
-from typing import Dict, List, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import gradio as gr
 from google import genai
@@ -22,8 +28,8 @@ CLIENT = genai.Client(api_key=GOOGLE_API_KEY)
 TITLE = """<h1 align="center">✨ Gemini Code Analysis</h1>"""
 AVATAR_IMAGES = (None, "https://media.roboflow.com/spaces/gemini-icon.png")
 
-# List of supported text extensions (alphabetically sorted)
-TEXT_EXTENSIONS = [
+# Set of supported text extensions (alphabetically sorted)
+TEXT_EXTENSIONS = frozenset({
     ".bat",
     ".c",
     ".cfg",
@@ -53,51 +59,279 @@ TEXT_EXTENSIONS = [
     ".xml",
     ".yaml",
     ".yml",
-]
+})
+
+# Set of supported text files without an extension (alphabetically sorted)
+TEXT_FILENAMES = frozenset({
+    ".dockerignore",
+    ".editorconfig",
+    ".gitattributes",
+    ".gitignore",
+    "Dockerfile",
+    "Gemfile",
+    "GNUmakefile",
+    "Jenkinsfile",
+    "Makefile",
+    "Procfile",
+    "Rakefile",
+    "Vagrantfile",
+})
+
+# Matches the start of the chat messages added by upload_zip (ZIP, single file, or multiple files)
+UPLOAD_MESSAGE_PATTERN = re.compile(r"<p>(?:📦 ZIP file uploaded:|📄 File uploaded:|📚 Multiple )")
+
+# MIME types sent to Gemini for known extensions, registered over the built-in
+# defaults of the mimetypes module. Anything else is sent as text/plain.
+MIME_TYPES = {
+    ".css": "text/css",
+    ".html": "text/html",
+    ".js": "text/javascript",
+    ".json": "application/json",
+    ".jsonl": "application/json",
+    ".jsx": "text/javascript",
+    ".py": "text/x-python",
+    ".svg": "application/xml",
+    ".ts": "text/typescript",
+    ".tsx": "text/typescript",
+    ".xml": "application/xml",
+}
+
+# MIME types other than text/* that Gemini accepts for file content
+NON_TEXT_MIME_TYPES = frozenset({"application/json", "application/xml"})
+
+
+def _build_mime_types() -> mimetypes.MimeTypes:
+    """
+    Build a private MIME type registry for the parts sent to Gemini.
+
+    The registry only holds Python's built-in defaults, so the result doesn't
+    depend on the host's mime.types files, and the process-wide registry used
+    to serve files is left untouched. Supported text extensions that map to a
+    non-text type (e.g. .sh as application/x-sh) are registered as text/plain.
+    """
+    registry = mimetypes.MimeTypes(filenames=())
+
+    for file_ext in TEXT_EXTENSIONS:
+        mime_type = registry.types_map[True].get(file_ext, "text/plain")
+        if not mime_type.startswith("text/") and mime_type not in NON_TEXT_MIME_TYPES:
+            registry.add_type("text/plain", file_ext)
+
+    for file_ext, mime_type in MIME_TYPES.items():
+        registry.add_type(mime_type, file_ext)
+
+    return registry
+
+
+_MIME = _build_mime_types()
+
+# Upper bound on the number of threads used to read entries from a ZIP archive
+MAX_EXTRACT_WORKERS = 16
 
+# Number of leading bytes inspected to tell text files from binary ones
+SNIFF_SIZE = 512
 
-def extract_text_from_zip(zip_file_path: str) -> Dict[str, str]:
+# Bytes that don't count as control characters when sniffing file content
+_NON_CONTROL_BYTES = bytes(range(9, 14)) + bytes(range(32, 256))
+
+# Extracted ZIP archives kept in memory for repeated uploads, least recently
+# used first and bounded by the total size of their content
+ZIP_CACHE_MAX_BYTES = 16 << 20
+ZIP_CACHE: "OrderedDict[tuple, Tuple[Dict[str, bytes], int]]" = OrderedDict()
+
+
+@lru_cache(maxsize=8192)
+def _ext(name: str) -> str:
     """
-    Extract text content from files in a ZIP archive.
+    Return the lower-cased extension of a file name, including the leading dot.
+    """
+    return os.path.splitext(name)[1].lower()
+
+
+@lru_cache(maxsize=8192)
+def _basename(path: str) -> str:
+    """
+    Return the final component of a file path.
+    """
+    return os.path.basename(path)
+
+
+def _is_text_file(name: str) -> bool:
+    """
+    Return whether a file name has a supported text extension or is a
+    supported text file without one.
+    """
+    return _ext(name) in TEXT_EXTENSIONS or _basename(name) in TEXT_FILENAMES
+
+
+def _is_text(head: bytes) -> bool:
+    """
+    Guess whether file content is text from its leading bytes.
+
+    Content is treated as binary if it contains a NUL byte or several other
+    control characters.
+    """
+    return b"\x00" not in head and len(head.translate(None, _NON_CONTROL_BYTES)) < 8
+
+
+def _as_utf8(content: bytes) -> bytes:
+    """
+    Return file content as valid UTF-8, replacing undecodable bytes with U+FFFD.
+
+    Content that is already valid UTF-8 is returned unchanged without a copy.
+    """
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("utf-8", errors="replace").encode("utf-8")
+    return content
+
+
+def _read_zip_entries(zip_file_path: str, entries: List[zipfile.ZipInfo]) -> Dict[str, bytes]:
+    """
+    Read a batch of entries from a ZIP archive.
+
+    Each call opens its own handle on the archive so that batches can be read
+    concurrently from different threads.
 
     Parameters:
         zip_file_path (str): Path to the ZIP file.
+        entries (List[zipfile.ZipInfo]): Entries of the archive to read.
 
     Returns:
-        Dict[str, str]: Dictionary mapping filenames to their text content.
+        Dict[str, bytes]: Dictionary mapping filenames to their raw text content.
     """
     text_contents = {}
 
     with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-        for file_info in zip_ref.infolist():
-            # Skip directories
-            if file_info.filename.endswith("/"):
-                continue
-
-            # Skip binary files and focus on text files
-            file_ext = os.path.splitext(file_info.filename)[1].lower()
-
-            if file_ext in TEXT_EXTENSIONS:
-                try:
-                    with zip_ref.open(file_info) as file:
-                        content = file.read().decode("utf-8", errors="replace")
-                        text_contents[file_info.filename] = content
-                except Exception as e:
-                    text_contents[file_info.filename] = (
-                        f"Error extracting file: {str(e)}"
-                    )
+        for file_info in entries:
+            try:
+                with zip_ref.open(file_info) as file:
+                    # Sniff the start of the entry so binary files are skipped
+                    # without decompressing the rest of them
+                    head = file.read(SNIFF_SIZE)
+                    if not _is_text(head):
+                        continue
+
+                    text_contents[file_info.filename] = _as_utf8(head + file.read())
+            except Exception as e:
+                text_contents[file_info.filename] = (
+                    f"Error extracting file: {str(e)}".encode("utf-8")
+                )
+
+    return text_contents
+
+
+def _cache_put(cache: OrderedDict, key: Any, value: Any, size: int, max_bytes: int):
+    """
+    Store a value in an LRU cache bounded by the total size of its values,
+    evicting the least recently used entries once max_bytes is exceeded.
+
+    Parameters:
+        cache (OrderedDict): Cache mapping keys to (value, size) pairs, least recently used first.
+        key (Any): Key of the value.
+        value (Any): Value to store.
+        size (int): Size of the value in bytes.
+        max_bytes (int): Maximum total size of the cached values.
+    """
+    cache[key] = (value, size)
+    cache.move_to_end(key)
+
+    total_size = sum(entry_size for _, entry_size in cache.values())
+    while cache and total_size > max_bytes:
+        _, (_, evicted_size) = cache.popitem(last=False)
+        total_size -= evicted_size
+
+
+def _extract_text_from_zip(zip_file_path: str) -> Dict[str, bytes]:
+    """
+    Extract text content from files in a ZIP archive, without caching.
+
+    Parameters:
+        zip_file_path (str): Path to the ZIP file.
+
+    Returns:
+        Dict[str, bytes]: Dictionary mapping filenames to their raw text content.
+    """
+    with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
+        entries = [
+            file_info
+            for file_info in zip_ref.infolist()
+            # Skip directories and focus on supported text files, whose
+            # content is sniffed later
+            if not file_info.filename.endswith("/")
+            and _is_text_file(file_info.filename)
+        ]
+
+    if not entries:
+        return {}
+
+    # Split the entries into contiguous batches, one per worker, so the
+    # merged result keeps the archive order
+    workers = min(MAX_EXTRACT_WORKERS, (os.cpu_count() or 1) * 2, len(entries))
+    batch_size = -(-len(entries) // workers)
+    batches = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+
+    text_contents = {}
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        for batch_contents in executor.map(partial(_read_zip_entries, zip_file_path), batches):
+            text_contents.update(batch_contents)
 
     return text_contents
 
 
-# Global variables
-EXTRACTED_FILES = {}
+def extract_text_from_zip(zip_file_path: str) -> Dict[str, bytes]:
+    """
+    Extract text content from files in a ZIP archive.
+
+    Re-uploading an unchanged archive reuses the previously extracted content.
+
+    Parameters:
+        zip_file_path (str): Path to the ZIP file.
+
+    Returns:
+        Dict[str, bytes]: Dictionary mapping filenames to their raw text content.
+    """
+    stat = os.stat(zip_file_path)
+    cache_key = (zip_file_path, stat.st_mtime, stat.st_size)
+
+    cached = ZIP_CACHE.get(cache_key)
+    if cached is None:
+        text_contents = _extract_text_from_zip(zip_file_path)
+        _cache_put(
+            ZIP_CACHE, cache_key, text_contents, sum(map(len, text_contents.values())), ZIP_CACHE_MAX_BYTES
+        )
+    else:
+        text_contents, _ = cached
+        ZIP_CACHE.move_to_end(cache_key)
+
+    # Copy so callers can't modify the cached result
+    return dict(text_contents)
+
+
+# Global variables, most recently uploaded last. Older uploads are dropped once
+# the extracted content exceeds EXTRACTED_FILES_MAX_BYTES in total.
+EXTRACTED_FILES_MAX_BYTES = 16 << 20
+EXTRACTED_FILES: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+
+# Content digest of each entry in EXTRACTED_FILES, computed at upload time
+EXTRACTED_DIGESTS = {}
+
+# Chat session key for the current EXTRACTED_FILES, updated whenever they change
+_SESSION_KEY: Optional[str] = None
 
-# Store chat sessions
-CHAT_SESSIONS = {}
+# Store chat sessions, most recently used last
+CHAT_SESSIONS_SIZE = 32
+CHAT_SESSIONS: "OrderedDict[str, Any]" = OrderedDict()
 
+# Number of streamed text chunks received between UI updates
+STREAM_UPDATE_INTERVAL = 8
 
-def extract_text_from_single_file(file_path: str) -> Dict[str, str]:
+# Pre-built Gemini parts for recently uploaded file sets, kept across resets
+PART_CACHE_MAX_BYTES = 16 << 20
+PART_CACHE: "OrderedDict[str, Tuple[List[types.Part], int]]" = OrderedDict()
+
+
+def extract_text_from_single_file(file_path: str) -> Dict[str, bytes]:
     """
     Extract text content from a single file.
 
@@ -105,23 +339,144 @@ def extract_text_from_single_file(file_path: str) -> Dict[str, str]:
         file_path (str): Path to the file.
 
     Returns:
-        Dict[str, str]: Dictionary mapping filename to its text content.
+        Dict[str, bytes]: Dictionary mapping filename to its raw text content.
     """
     text_contents = {}
-    filename = os.path.basename(file_path)
-    file_ext = os.path.splitext(filename)[1].lower()
+    filename = _basename(file_path)
 
-    if file_ext in TEXT_EXTENSIONS:
+    if _is_text_file(filename):
         try:
-            with open(file_path, "r", encoding="utf-8", errors="replace") as file:
-                content = file.read()
-                text_contents[filename] = content
+            # Read the raw bytes with a single open/fstat/read/close instead
+            # of setting up a buffered text stream
+            fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            try:
+                content = os.read(fd, os.fstat(fd).st_size)
+            finally:
+                os.close(fd)
+
+            # Skip binary files, whatever their extension
+            if _is_text(content[:SNIFF_SIZE]):
+                text_contents[filename] = _as_utf8(content)
         except Exception as e:
-            text_contents[filename] = f"Error reading file: {str(e)}"
+            text_contents[filename] = f"Error reading file: {str(e)}".encode("utf-8")
 
     return text_contents
 
 
+def digest_files(files: Dict[str, bytes]) -> str:
+    """
+    Compute a digest over the names and contents of extracted files.
+
+    Parameters:
+        files (Dict[str, bytes]): Dictionary mapping filenames to their raw text content.
+
+    Returns:
+        str: Hex digest identifying the files, independent of their order.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for filename in sorted(files):
+        content = files[filename]
+        digest.update(f"{filename}:{len(content)}".encode("utf-8") + b"\x00")
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def _update_session_key():
+    """
+    Recompute the chat session key from the digests of the extracted files.
+    """
+    global _SESSION_KEY
+
+    _SESSION_KEY = hashlib.blake2b(
+        "|".join(sorted(EXTRACTED_DIGESTS.values())).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def store_extracted_files(upload_name: str, files: Dict[str, bytes]):
+    """
+    Record the files extracted from an upload and update the chat session key.
+
+    Parameters:
+        upload_name (str): Name of the uploaded ZIP or text file.
+        files (Dict[str, bytes]): Dictionary mapping filenames to their raw text content.
+    """
+    EXTRACTED_FILES[upload_name] = files
+    EXTRACTED_FILES.move_to_end(upload_name)
+    EXTRACTED_DIGESTS[upload_name] = digest_files(files)
+    _update_session_key()
+
+
+def evict_extracted_files(keep: Set[str]) -> List[str]:
+    """
+    Drop the oldest uploads until the extracted files fit in EXTRACTED_FILES_MAX_BYTES.
+
+    Uploads named in keep are never dropped, so the current upload is always
+    kept in full even if it exceeds the limit on its own.
+
+    Parameters:
+        keep (Set[str]): Names of the uploads that must be kept.
+
+    Returns:
+        List[str]: Names of the dropped uploads, oldest first.
+    """
+    sizes = {
+        upload_name: sum(map(len, files.values()))
+        for upload_name, files in EXTRACTED_FILES.items()
+    }
+    total_size = sum(sizes.values())
+
+    dropped = []
+    for upload_name in list(EXTRACTED_FILES):
+        if total_size <= EXTRACTED_FILES_MAX_BYTES:
+            break
+        if upload_name in keep:
+            continue
+
+        del EXTRACTED_FILES[upload_name]
+        del EXTRACTED_DIGESTS[upload_name]
+        total_size -= sizes[upload_name]
+        dropped.append(upload_name)
+
+    if dropped:
+        _update_session_key()
+
+    return dropped
+
+
+def _dropped_uploads_message(dropped: List[str]) -> str:
+    """
+    Build the chat notice listing earlier uploads dropped to stay within the size limit.
+    """
+    if not dropped:
+        return ""
+
+    return f"<p>Removed earlier uploads to stay within the size limit: {', '.join(dropped)}</p>"
+
+
+def iter_parts(extracted_files: Dict[str, Dict[str, bytes]]) -> Iterator[types.Part]:
+    """
+    Lazily build the Gemini parts used to share extracted files with a chat session.
+
+    Parameters:
+        extracted_files (Dict[str, Dict[str, bytes]]): Extracted files grouped by upload.
+
+    Yields:
+        types.Part: One part per file, prefixed with the file's name.
+    """
+    for files in extracted_files.values():
+        for filename, content in files.items():
+            mime_type = _MIME.types_map[True].get(_ext(filename), "text/plain")
+
+            # Prepend a header with the filename to preserve original file identity.
+            # The content is kept as the raw UTF-8 bytes read from the upload.
+            payload = b"File: " + filename.encode("utf-8") + b"\n\n" + content
+
+            yield types.Part.from_bytes(
+                data=payload,
+                mime_type=mime_type,
+            )
+
+
 def upload_zip(files: Optional[List[str]], chatbot: List[tuple]):
     """
     Process uploaded files (ZIP or single text files): extract text content and append a message to the chat.
@@ -133,18 +488,18 @@ def upload_zip(files: Optional[List[str]], chatbot: List[tuple]):
     Returns:
         List[tuple]: Updated conversation history.
     """
-    global EXTRACTED_FILES
-
     # Handle multiple file uploads
     if len(files) > 1:
         total_files_processed = 0
         total_files_extracted = 0
         file_types = set()
+        filenames = []
 
         # Process each file
         for file in files:
-            filename = os.path.basename(file)
-            file_ext = os.path.splitext(filename)[1].lower()
+            filename = _basename(file)
+            filenames.append(filename)
+            file_ext = _ext(filename)
 
             # Process based on file type
             if file_ext == ".zip":
@@ -157,7 +512,7 @@ def upload_zip(files: Optional[List[str]], chatbot: List[tuple]):
             if extracted_files:
                 total_files_extracted += len(extracted_files)
                 # Store the extracted content in the global variable
-                EXTRACTED_FILES[filename] = extracted_files
+                store_extracted_files(filename, extracted_files)
 
             total_files_processed += 1
 
@@ -169,18 +524,22 @@ def upload_zip(files: Optional[List[str]], chatbot: List[tuple]):
         )
 
         # Create a list of uploaded file names
-        file_list = "\n".join([f"- {os.path.basename(file)}" for file in files])
+        file_list = "\n".join(map("- {}".format, filenames))
+
+        # Make room for this upload by dropping earlier ones if needed
+        dropped = evict_extracted_files(set(filenames))
 
         chatbot.append((
             "user",
             f"<p>📚 Multiple {file_types_str} uploaded ({total_files_processed} files)</p><p>Extracted {total_files_extracted} text file(s) in total</p><p>Uploaded files:</p><pre>{file_list}</pre>"
+            + _dropped_uploads_message(dropped)
         ))
 
     # Handle single file upload (original behavior)
     elif len(files) == 1:
         file = files[0]
-        filename = os.path.basename(file)
-        file_ext = os.path.splitext(filename)[1].lower()
+        filename = _basename(file)
+        file_ext = _ext(filename)
 
         # Process based on file type
         if file_ext == ".zip":
@@ -196,15 +555,18 @@ def upload_zip(files: Optional[List[str]], chatbot: List[tuple]):
                 f"<p>{file_type_msg} uploaded: {filename}, but no text content was found or the file format is not supported.</p>"
             ))
         else:
-            file_list = "\n".join([f"- {name}" for name in extracted_files.keys()])
+            # Store the extracted content in the global variable, making room
+            # for it by dropping earlier uploads if needed
+            store_extracted_files(filename, extracted_files)
+            dropped = evict_extracted_files({filename})
+
+            file_list = "\n".join(map("- {}".format, extracted_files))
             chatbot.append((
                 "user",
                 f"<p>{file_type_msg} uploaded: {filename}</p><p>Extracted {len(extracted_files)} text file(s):</p><pre>{file_list}</pre>"
+                + _dropped_uploads_message(dropped)
             ))
 
-            # Store the extracted content in the global variable
-            EXTRACTED_FILES[filename] = extracted_files
-
     return chatbot
 
 
@@ -238,117 +600,105 @@ def get_message_content(msg: tuple) -> str:
     return msg[1] if len(msg) > 1 else ""
 
 
-def send_to_gemini(chatbot: List[tuple]):
+async def send_to_gemini(chatbot: List[tuple]):
     """
     Send the user's prompt to Gemini and display the response.
     If code files were uploaded, they will be included in the context.
 
+    Runs on Gradio's event loop using the async Gemini client, so concurrent
+    users don't block each other while waiting on the network.
+
     Parameters:
         chatbot (List[tuple]): The conversation history.
 
-    Returns:
+    Yields:
         List[tuple]: The updated conversation history with Gemini's response.
     """
-    global EXTRACTED_FILES, CHAT_SESSIONS
-
     if len(chatbot) == 0:
         chatbot.append(("assistant", "Please enter a message to start the conversation."))
-        return chatbot
+        yield chatbot
+        return
 
     # Get the last user message as the prompt
-    user_messages = [msg for msg in chatbot if msg[0] == "user"]
+    last_user_msg = next((msg for msg in reversed(chatbot) if msg[0] == "user"), None)
 
-    if not user_messages:
+    if last_user_msg is None:
         chatbot.append(("assistant", "Please enter a message to start the conversation."))
-        return chatbot
+        yield chatbot
+        return
 
-    last_user_msg = user_messages[-1]
     prompt = get_message_content(last_user_msg)
 
     # Skip if the last message was about uploading a file (ZIP, single file, or multiple files)
-    if any(upload_msg in prompt for upload_msg in ["📦 ZIP file uploaded:", "📄 File uploaded:", "📚 Multiple files uploaded"]):
+    if UPLOAD_MESSAGE_PATTERN.match(prompt):
         chatbot.append(("assistant", "What would you like to know about the code in this ZIP file?"))
-        return chatbot
+        yield chatbot
+        return
 
-    # Generate a unique session ID based on the extracted files or use a default key for no files
-    if EXTRACTED_FILES:
-        session_key = ",".join(sorted(EXTRACTED_FILES.keys()))
-    else:
-        session_key = "no_files"
+    # Use the session key computed at upload time or a default key for no files
+    session_key = _SESSION_KEY or "no_files"
 
     # Create a new chat session if one doesn't exist for this set of files
     if session_key not in CHAT_SESSIONS:
         # Configure Gemini with code execution capability
-        CHAT_SESSIONS[session_key] = CLIENT.chats.create(
+        chat = CLIENT.aio.chats.create(
             model="gemini-2.5-pro-exp-03-25",
         )
 
-        # Send all extracted files to the chat session first
-        initial_contents = []
-        for zip_name, files in EXTRACTED_FILES.items():
-            for filename, content in files.items():
-                file_ext = os.path.splitext(filename)[1].lower()
-                mime_type = "text/plain"
-
-                # Set appropriate mime type based on file extension
-                if file_ext == ".py":
-                    mime_type = "text/x-python"
-                elif file_ext in [".js", ".jsx"]:
-                    mime_type = "text/javascript"
-                elif file_ext in [".ts", ".tsx"]:
-                    mime_type = "text/typescript"
-                elif file_ext == ".html":
-                    mime_type = "text/html"
-                elif file_ext == ".css":
-                    mime_type = "text/css"
-                elif file_ext in [".json", ".jsonl"]:
-                    mime_type = "application/json"
-                elif file_ext in [".xml", ".svg"]:
-                    mime_type = "application/xml"
-
-                # Create a header with the filename to preserve original file identity
-                file_header = f"File: {filename}\n\n"
-                file_content = file_header + content
-
-                initial_contents.append(
-                    types.Part.from_bytes(
-                        data=file_content.encode("utf-8"),
-                        mime_type=mime_type,
-                    )
-                )
+        # Send all extracted files to the chat session first, reusing the parts
+        # built for an earlier session over the same files when possible
+        cached = PART_CACHE.get(session_key)
+        if cached is None:
+            initial_contents = list(iter_parts(EXTRACTED_FILES))
+            parts_size = sum(
+                len(content) for files in EXTRACTED_FILES.values() for content in files.values()
+            )
+            _cache_put(PART_CACHE, session_key, initial_contents, parts_size, PART_CACHE_MAX_BYTES)
+        else:
+            initial_contents, _ = cached
+            PART_CACHE.move_to_end(session_key)
 
         # Initialize the chat context with files if available
         if initial_contents:
-            initial_contents.append(
-                "I've uploaded these code files for you to analyze. I'll ask questions about them next."
+            await chat.send_message(
+                initial_contents
+                + ["I've uploaded these code files for you to analyze. I'll ask questions about them next."]
             )
-            # Use synchronous API instead of async
-            CHAT_SESSIONS[session_key].send_message(initial_contents)
         # For sessions without files, we don't need to send an initial message
 
+        # Only publish the session once it has its file context, so other
+        # events never pick up a session whose initial message is pending or failed
+        CHAT_SESSIONS[session_key] = chat
+        if len(CHAT_SESSIONS) > CHAT_SESSIONS_SIZE:
+            CHAT_SESSIONS.popitem(last=False)
+    else:
+        chat = CHAT_SESSIONS[session_key]
+        CHAT_SESSIONS.move_to_end(session_key)
+
     # Append a placeholder for the assistant's response
     chatbot.append(("assistant", ""))
 
     # Send the user's prompt to the existing chat session using streaming API
-    response = CHAT_SESSIONS[session_key].send_message_stream(prompt)
+    response = await chat.send_message_stream(prompt)
 
     # Process the response stream - text only (no images)
-    output_text = ""
-    for chunk in response:
+    text_parts: List[str] = []
+    async for chunk in response:
         if chunk.candidates and chunk.candidates[0].content.parts:
             for part in chunk.candidates[0].content.parts:
                 if part.text is not None:
                     # Append the new chunk of text
-                    output_text += part.text
+                    text_parts.append(part.text)
 
-                    # Update the last assistant message with the current accumulated response
-                    chatbot[-1] = ("assistant", output_text)
+                    # Every few chunks, update the last assistant message with the
+                    # accumulated response and yield it to show streaming updates in the UI
+                    if len(text_parts) % STREAM_UPDATE_INTERVAL == 0:
+                        chatbot[-1] = ("assistant", "".join(text_parts))
+                        yield chatbot
 
-                    # Yield the updated chatbot to show streaming updates in the UI
-                    yield chatbot
-
-    # Return the final chatbot state
-    return chatbot
+    # Flush the remaining text and yield the final chatbot state
+    chatbot[-1] = ("assistant", "".join(text_parts))
+    yield chatbot
 
 
 def reset_app(chatbot):
@@ -361,11 +711,13 @@ def reset_app(chatbot):
     Returns:
         List[tuple]: A fresh conversation history.
     """
-    global EXTRACTED_FILES, CHAT_SESSIONS
+    global EXTRACTED_FILES, EXTRACTED_DIGESTS, CHAT_SESSIONS, _SESSION_KEY
 
     # Clear the global variables
-    EXTRACTED_FILES = {}
-    CHAT_SESSIONS = {}
+    EXTRACTED_FILES = OrderedDict()
+    EXTRACTED_DIGESTS = {}
+    _SESSION_KEY = None
+    CHAT_SESSIONS = OrderedDict()
 
     # Reset the chatbot with a welcome message
     return [("assistant", "App has been reset. You can start a new conversation or upload new files.")]
@@ -387,7 +739,7 @@ text_prompt_component = gr.Textbox(
 upload_zip_button_component = gr.UploadButton(
     label="Upload",
     file_count="multiple",
-    file_types=[".zip"] + TEXT_EXTENSIONS,
+    file_types=[".zip"] + sorted(TEXT_EXTENSIONS),
     scale=1,
     min_width=80,
 )